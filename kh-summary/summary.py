@@ -1,7 +1,11 @@
 # /// script
 # dependencies = [
+#     "numba>=0.58.0",
+#     "numpy>=1.24.0",
+#     "orjson>=3.9.0",
 #     "pandas>=2.0.0",
 #     "plotly>=5.17.0",
+#     "pyarrow>=14.0.0",
 # ]
 # ///
 
@@ -10,39 +14,104 @@
 # first transaction in Aug 2014, export from ..July
 #####
 
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from datetime import datetime
+# pandas, plotly and numba are imported inside the functions using them, they take a while to load
+# and the script should fail fast on a wrong invocation
+import numpy as np
+import functools
+import hashlib
+import json
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 import webbrowser
 
 # needed since header row of raw export had unnecessary nbsps and whitespaces, leading to wrong column parsing
-def fix_header_line(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    header_line = lines[0]
+def fix_header_line(f):
+    header_line = f.readline().decode('utf-8')
     
     # Replace any non-tab whitespace with nothing, but preserve tabs
     fixed_header = ''.join(char if char == '\t' or not char.isspace() else '' 
                           for char in header_line)
-    lines[0] = fixed_header
     
-    # Write back to a temporary file or overwrite
-    temp_file = file_path + '_fixed.csv'
-    with open(temp_file, 'w', encoding='utf-8') as f:
-        f.writelines(lines)
+    # Column names are handed to read_csv directly, the rest of the file is parsed from where the header ended
+    return fixed_header.split('\t')
+
+# kept as an explicit loop so per-row rules (e.g. resetting on account changes) can be added without leaving numba
+def running_balance(amounts):
+    out = np.empty_like(amounts)
+    total = 0.0
+    for i in range(amounts.size):
+        total += amounts[i]
+        out[i] = total
+    return out
+
+# Largest-Triangle-Three-Buckets: picks n_out points that keep the visual shape of the curve
+def lttb(x, y, n_out):
+    n = x.size
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
     
-    return temp_file
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[n_out - 1] = n - 1
+    bucket_size = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        # average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        
+        max_area = -1.0
+        chosen = a
+        for j in range(int(i * bucket_size) + 1, int((i + 1) * bucket_size) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        out[i + 1] = chosen
+        a = chosen
+    return out
+
+# the kernels above jitted with numba, or None without it - as plain Python loops they are slower
+# than the NumPy fallbacks, so callers only use them when jitted
+@functools.lru_cache(maxsize=None)
+def load_kernels():
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+    return SimpleNamespace(running_balance=njit(cache=True)(running_balance), lttb=njit(cache=True)(lttb))
 
 def read_and_process_csv(csv_file_path):
     """Read CSV and process bank transactions - keep only required columns"""
+    import pandas as pd
+    
     try:
-        fixed_file = fix_header_line(csv_file_path)
-
-        df = pd.read_csv(fixed_file, sep='\t', encoding='utf-8', skipinitialspace=True)
+        # low-cardinality text as categories, HUF amounts never have a fractional part
+        dtypes = {'típus': 'category', 'összegdevizaneme': 'category', 'összeg': 'Int64'}
+        # the export has more columns than these, the rest are never read into memory
+        used_columns = ['könyvelésdátuma', 'típus', 'összeg', 'összegdevizaneme', 'partnerelnevezése', 'közlemény']
+        with open(csv_file_path, 'rb') as f:
+            columns = fix_header_line(f)
+            data_start = f.tell()
+            try:
+                # multithreaded parser, noticeably faster on long exports
+                # (pyarrow mislabels usecols combined with names, so pick the columns by position)
+                used_positions = sorted(columns.index(column) for column in used_columns)
+                df = pd.read_csv(f, sep='\t', encoding='utf-8', header=None, usecols=used_positions,
+                                 engine='pyarrow', dtype_backend='pyarrow')
+                df.columns = [columns[i] for i in used_positions]
+                # the pyarrow engine has no skipinitialspace, strip the text columns like the C engine
+                # would (a field of only spaces ends up missing) before they are turned into categories
+                for column in df.select_dtypes(include='string').columns:
+                    df[column] = df[column].str.lstrip(' ').replace('', None)
+                df = df.astype(dtypes)
+            except ImportError:
+                f.seek(data_start)
+                df = pd.read_csv(f, sep='\t', encoding='utf-8', header=None, names=columns, usecols=used_columns,
+                                 dtype=dtypes, skipinitialspace=True)
         
         # Remove any completely empty rows
         df = df.dropna(how='all')
@@ -51,30 +120,38 @@ def read_and_process_csv(csv_file_path):
         print(df[df.columns[0]])
         
         # Check for non-HUF currencies first, just for safety
-        non_huf = df[df['összegdevizaneme'] != 'HUF']
-        if not non_huf.empty:
+        # (only slice out the offending rows when there are any, the usual export is all HUF)
+        non_huf_mask = (df['összegdevizaneme'] != 'HUF').to_numpy(dtype=bool)
+        if non_huf_mask.any():
+            non_huf = df.loc[non_huf_mask, ['könyvelésdátuma', 'összeg', 'összegdevizaneme']]
             print(f"Error: Found {len(non_huf)} transactions with non-HUF currency:")
-            for _, row in non_huf.iterrows():
-                print(f"  Date: {row['könyvelésdátuma']}, Amount: {row['összeg']} {row['összegdevizaneme']}")
+            for date, amount, currency in non_huf.itertuples(index=False, name=None):
+                print(f"  Date: {date}, Amount: {amount} {currency}")
             return None
         
-        df['date'] = pd.to_datetime(df['könyvelésdátuma'], format='%Y.%m.%d')
-
         df = df[df['típus'] != 'Számlamegszüntetés átvezetéssel'] # old account was weirdly merged
 
-        df = df.sort_values('date')
-        
-        df['date'] = pd.to_datetime(df['date'])
+        # YYYY.MM.DD strings sort the same as the dates, stable so same-day rows keep their export order
+        df = df.sort_values('könyvelésdátuma', kind='stable')
 
-        # Group by date and add incremental hours (export only has date, needed for better detail in chart)
-        df['date'] = df.groupby(df['date'].dt.date)['date'].transform(
-            lambda x: x + pd.to_timedelta(range(len(x)), unit='H')
-        )
+        # ISO-style dates hit pandas' fast parsing path, and the cache helps since many rows share a date
+        df['date'] = pd.to_datetime(df['könyvelésdátuma'].str.replace('.', '-', regex=False),
+                                    format='%Y-%m-%d', cache=True)
 
-        df['balance'] = df['összeg'].cumsum()
-        df['description'] = df['partnerelnevezése'].fillna(
-            df['közlemény'].fillna('No Description')
-        )
+        # Add incremental hours within each date (export only has date, needed for better detail in chart)
+        # rows are sorted, so the position within a day is the distance from where that day's run starts
+        day = df['date'].to_numpy().astype('datetime64[D]')
+        day_starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        within_day = np.arange(len(df)) - np.repeat(day_starts, np.diff(np.r_[day_starts, len(df)]))
+        df['date'] = df['date'] + pd.to_timedelta(within_day, unit='h')
+
+        amounts = df['összeg'].to_numpy(np.float64, na_value=0.0)
+        kernels = load_kernels()
+        df['balance'] = kernels.running_balance(amounts) if kernels is not None else np.cumsum(amounts)
+        partner = df['partnerelnevezése'].to_numpy()
+        message = df['közlemény'].to_numpy()
+        df['description'] = np.where(pd.notna(partner), partner,
+                                     np.where(pd.notna(message), message, 'No Description'))
         return df
         
     except Exception as e:
@@ -83,24 +160,41 @@ def read_and_process_csv(csv_file_path):
 
 def create_plotly_chart(df):
     """Create interactive Plotly chart"""
+    import plotly.graph_objects as go
     
-    hover_data = []
-    for _, row in df.iterrows():        
-        amount_color = "🟢" if row['összeg'] > 0 else "🔴" if row['összeg'] < 0 else "⚪"
-        amount_sign = "+" if row['összeg'] > 0 else ""
-        
-        hover_text = (
-            f"<b>{row['date'].strftime('%Y-%m-%d')}</b><br>"
-            f"<b>Balance:</b> {row['balance']:,.0f} HUF<br>"
-            f"<b>Change:</b> {amount_color} {amount_sign}{row['összeg']:,.0f} HUF<br>"
-            f"<b>Description:</b> {row['description']}"
-            
-        )
-        hover_data.append(hover_text)
+    # browsers struggle with very long series even in WebGL, so plot a downsampled view
+    # (peak and lowest rows are always kept, the annotations point at them; needs numba to be fast enough)
+    kernels = load_kernels() if len(df) > 5000 else None
+    if kernels is not None:
+        x = df['date'].to_numpy().astype('datetime64[s]').astype(np.float64)
+        y = df['balance'].to_numpy(np.float64)
+        idx = np.union1d(kernels.lttb(x, y, 3000), [y.argmax(), y.argmin()])
+        df = df.iloc[idx]
     
+    # a blank amount is read as NA, count it as 0 like the running balance does
+    amount = df['összeg'].fillna(0)
+    amount_color = np.where(amount > 0, "🟢", np.where(amount < 0, "🔴", "⚪"))
+    amount_sign = np.where(amount > 0, "+", "")
+
+    hover_data = (
+        "<b>" + df['date'].dt.strftime('%Y-%m-%d') + "</b><br>"
+        + "<b>Balance:</b> " + df['balance'].map('{:,.0f}'.format) + " HUF<br>"
+        + "<b>Change:</b> " + amount_color + " " + amount_sign + amount.map('{:,.0f}'.format) + " HUF<br>"
+        + "<b>Description:</b> " + df['description'].astype(str)
+    ).to_numpy()
+    
+    # SVG rendering gets sluggish with many points, switch to WebGL for long histories
+    # (scattergl has no spline support, so fall back to straight segments there)
+    use_webgl = len(df) >= 1000
+    scatter = go.Scattergl if use_webgl else go.Scatter
+    line_shape = 'linear' if use_webgl else 'spline'
+    # unified hover and spike lines redraw on every mouse move, too costly on many points
+    show_spikes = len(df) < 2000
+    hovermode = 'x unified' if show_spikes else 'closest'
+
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=df['date'],
         y=df['balance'],
         mode='lines+markers',
@@ -108,7 +202,7 @@ def create_plotly_chart(df):
         line=dict(
             color='rgba(55, 128, 191, 1)',
             width=3,
-            shape='spline'
+            shape=line_shape
         ),
         marker=dict(
             size=6,
@@ -129,35 +223,38 @@ def create_plotly_chart(df):
         annotation_position="bottom right"
     )
     
-    positive_mask = df['balance'] >= 0
-    if positive_mask.any():
-        fig.add_trace(go.Scatter(
-            x=df[positive_mask]['date'],
-            y=df[positive_mask]['balance'],
-            mode='none',
-            fill='tozeroy',
-            fillcolor='rgba(72, 187, 120, 0.2)',
-            name='Positive Balance',
-            showlegend=False,
-            hoverinfo='skip'
-        ))
+    dates = df['date'].to_numpy()
+    balance = df['balance'].to_numpy()
     
-    negative_mask = df['balance'] < 0
-    if negative_mask.any():
-        fig.add_trace(go.Scatter(
-            x=df[negative_mask]['date'],
-            y=df[negative_mask]['balance'],
+    sign_bands = (
+        (balance >= 0, 'rgba(72, 187, 120, 0.2)', 'Positive Balance'),
+        (balance < 0, 'rgba(245, 101, 101, 0.2)', 'Negative Balance'),
+    )
+    for mask, fillcolor, name in sign_bands:
+        idx = np.flatnonzero(mask)
+        if idx.size == 0:
+            continue
+        # one trace per sign: every contiguous run is closed down to the zero line into its own polygon,
+        # and a NaN gap between them makes 'toself' fill each one separately (a gap does not split 'tozeroy')
+        runs = np.split(idx, np.flatnonzero(np.diff(idx) > 1) + 1)
+        x = np.concatenate([dates[np.r_[run[0], run, run[-1], run[-1]]] for run in runs])
+        y = np.concatenate([np.r_[0.0, balance[run], 0.0, np.nan] for run in runs])
+        fig.add_trace(scatter(
+            x=x,
+            y=y,
             mode='none',
-            fill='tozeroy',
-            fillcolor='rgba(245, 101, 101, 0.2)',
-            name='Negative Balance',
+            fill='toself',
+            fillcolor=fillcolor,
+            name=name,
             showlegend=False,
             hoverinfo='skip'
         ))
     
     current_balance = df['balance'].iloc[-1]
-    min_balance = df['balance'].min()
-    max_balance = df['balance'].max()
+    imax = balance.argmax()
+    imin = balance.argmin()
+    max_balance = balance[imax]
+    min_balance = balance[imin]
     
     fig.update_layout(
         title=dict(
@@ -170,7 +267,7 @@ def create_plotly_chart(df):
             title="Date",
             showgrid=True,
             gridcolor='rgba(128, 128, 128, 0.2)',
-            showspikes=True,
+            showspikes=show_spikes,
             spikecolor="rgba(128, 128, 128, 0.5)",
             spikethickness=1
         ),
@@ -179,11 +276,11 @@ def create_plotly_chart(df):
             showgrid=True,
             gridcolor='rgba(128, 128, 128, 0.2)',
             tickformat=',.0f',
-            showspikes=True,
+            showspikes=show_spikes,
             spikecolor="rgba(128, 128, 128, 0.5)",
             spikethickness=1
         ),
-        hovermode='x unified',
+        hovermode=hovermode,
         plot_bgcolor='white',
         paper_bgcolor='white',
         font=dict(family="Open Sans, sans-serif", size=12, color='#2D3748'),
@@ -212,7 +309,7 @@ def create_plotly_chart(df):
     )
     
     fig.add_annotation(
-        x=df[df['balance'] == max_balance]['date'].iloc[0],
+        x=df['date'].iat[imax],
         y=max_balance,
         text=f"Peak: {max_balance:,.0f} HUF",
         showarrow=True,
@@ -225,7 +322,7 @@ def create_plotly_chart(df):
     
     if min_balance < 0:
         fig.add_annotation(
-            x=df[df['balance'] == min_balance]['date'].iloc[0],
+            x=df['date'].iat[imin],
             y=min_balance,
             text=f"Lowest: {min_balance:,.0f} HUF",
             showarrow=True,
@@ -238,6 +335,59 @@ def create_plotly_chart(df):
     
     return fig
 
+# fig.write_html validates and serializes the figure with the stdlib json module, which is slow with
+# thousands of hover strings - the figure is already built from valid values, so dump it directly
+def write_chart_html(fig, output_file, config, cache_key):
+    import plotly.io as pio
+    from plotly.offline import get_plotlyjs_version
+    
+    # 'auto' picks orjson when it is installed
+    fig_json = pio.to_json(fig, validate=False, engine='auto')
+    config_json = json.dumps({**config, 'responsive': True})
+    
+    html = f"""<!DOCTYPE html>
+<!-- source: {cache_key} -->
+<html>
+<head>
+    <meta charset="utf-8">
+    <script charset="utf-8" src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>
+</head>
+<body>
+    <div id="chart" style="width: 100%; height: 600px;"></div>
+    <script>
+        const fig = {fig_json};
+        Plotly.newPlot('chart', fig.data, fig.layout, {config_json});
+    </script>
+</body>
+</html>
+"""
+    output_file.write_text(html, encoding='utf-8')
+
+# the same export (content prefix, size, mtime) rendered by the same version of this script always maps to the same key
+def chart_cache_key(csv_file_path):
+    csv_stat = Path(csv_file_path).stat()
+    digest = hashlib.blake2b(digest_size=8)
+    with open(csv_file_path, 'rb') as f:
+        digest.update(f.read(1 << 20))
+    digest.update(f"{csv_stat.st_size}:{csv_stat.st_mtime_ns}:{Path(__file__).stat().st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+# the key of the export a chart was rendered from is stored in a comment at the top of the html
+def chart_is_current(output_file, cache_key):
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            return f"<!-- source: {cache_key} -->" in f.read(200)
+    except OSError:
+        return False
+
+def open_chart(output_file):
+    try:
+        webbrowser.open(f"file://{output_file.absolute()}")
+        print("🌐 Opening chart in your default browser...")
+    except Exception as e:
+        print(f"Could not open browser automatically: {e}")
+        print(f"Please open {output_file.absolute()} manually in your browser")
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python bank_chart.py <csv_file_path>")
@@ -245,20 +395,34 @@ def main():
     
     csv_file_path = sys.argv[1]
     
+    output_file = Path("bank_balance_chart.html")
+    try:
+        cache_key = chart_cache_key(csv_file_path)
+    except OSError as e:
+        print(f"Error reading CSV: {e}")
+        sys.exit(1)
+    
+    # running again on an unchanged export just reopens the chart rendered last time
+    if chart_is_current(output_file, cache_key):
+        print(f"📊 Chart is up to date: {output_file.absolute()}")
+        open_chart(output_file)
+        return
+    
     df = read_and_process_csv(csv_file_path)
     if df is None:
         sys.exit(1)
     
     print(f"✅ Successfully processed {len(df)} transactions")
-    print(f"📅 Date range: {df['date'].min().strftime('%Y-%m-%d')} to {df['date'].max().strftime('%Y-%m-%d')}")
+    # rows are sorted by date, so the ends of the column are the range
+    print(f"📅 Date range: {df['date'].iat[0]:%Y-%m-%d} to {df['date'].iat[-1]:%Y-%m-%d}")
     print(f"💰 Final balance: {df['balance'].iloc[-1]:,.0f} HUF")
     print(f"📊 Balance range: {df['balance'].min():,.0f} to {df['balance'].max():,.0f} HUF")
     
     fig = create_plotly_chart(df)
     
-    output_file = Path("bank_balance_chart.html")
-    fig.write_html(
-        str(output_file),
+    write_chart_html(
+        fig,
+        output_file,
         config={
             'displayModeBar': True,
             'displaylogo': False,
@@ -271,17 +435,12 @@ def main():
                 'scale': 2
             }
         },
-        include_plotlyjs='cdn'
+        cache_key=cache_key
     )
     
     print(f"📊 Interactive chart saved as: {output_file.absolute()}")
     
-    try:
-        webbrowser.open(f"file://{output_file.absolute()}")
-        print("🌐 Opening chart in your default browser...")
-    except Exception as e:
-        print(f"Could not open browser automatically: {e}")
-        print(f"Please open {output_file.absolute()} manually in your browser")
+    open_chart(output_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file